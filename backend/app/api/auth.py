@@ -2,17 +2,42 @@ from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
-from datetime import datetime, timedelta
+from dataclasses import dataclass
+from datetime import datetime
 from typing import Optional
-import bcrypt
+import asyncio
+import hashlib
+import hmac
+import secrets
+import threading
+import time
 import jwt
+from cachetools import TTLCache
 from app.core.database import get_db
 from app.core.config import settings
+from app.core.security import BCRYPT_POOL, hash_password, needs_rehash, verify_password
 from app.models.user import User
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
+# Recent successful logins: HMAC(email:password) -> hash it was verified against.
+# Only successes are cached and the key is peppered, so no plaintext is kept.
+_verified_logins = TTLCache(maxsize=10_000, ttl=60)
+_verified_logins_lock = threading.Lock()
+
+# Built once; missing exp/sub claims are rejected inside PyJWT
+_JWT_DECODE_OPTIONS = {
+    "algorithms": [settings.ALGORITHM],
+    "options": {"require": ["exp", "sub"]},
+}
+
+# Checked when the email is unknown; built once at import, not per request
+DUMMY_HASH = hash_password(secrets.token_urlsafe(16), settings.BCRYPT_ROUNDS)
+
+# Users resolved from the database for tokens too old to trust on claims alone
+_user_ctx_cache = TTLCache(maxsize=10_000, ttl=60)
+
 # Pydantic models
 class UserCreate(BaseModel):
     username: str
@@ -36,28 +61,35 @@ class Token(BaseModel):
     token_type: str
     user: UserResponse
 
-class TokenData(BaseModel):
-    username: Optional[str] = None
+@dataclass(frozen=True)
+class UserCtx:
+    """Authenticated user as carried in the JWT claims"""
+    id: int
+    username: str
+    is_active: bool = True
 
 # Utility functions
-def hash_password(password: str) -> str:
-    """Hash a password using bcrypt"""
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+async def run_in_bcrypt_pool(func, *args):
+    """Run a CPU-bound bcrypt helper in the process pool instead of on the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(BCRYPT_POOL, func, *args)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+def user_response(user: User) -> UserResponse:
+    """Build a UserResponse from a trusted DB row without re-running validation"""
+    return UserResponse.model_construct(**{field: getattr(user, field) for field in UserResponse.model_fields})
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    """Create JWT access token"""
+def _login_cache_key(email: str, password: str) -> bytes:
+    """Peppered key for the verified-login cache"""
+    message = f"{email}:{password}".encode('utf-8')
+    return hmac.new(settings.SECRET_KEY.encode('utf-8'), message, hashlib.sha256).digest()
+
+def create_access_token(data: dict, expires_in: Optional[int] = None):
+    """Create JWT access token (expires_in is in seconds)"""
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    now = int(time.time())
+    expire = now + (expires_in or settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
     
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": now})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
@@ -69,9 +101,9 @@ def get_user_by_username(db: Session, username: str) -> Optional[User]:
     """Get user by username"""
     return db.query(User).filter(User.username == username).first()
 
-def create_user(db: Session, user: UserCreate) -> User:
+async def create_user(db: Session, user: UserCreate) -> User:
     """Create new user"""
-    hashed_password = hash_password(user.password)
+    hashed_password = await run_in_bcrypt_pool(hash_password, user.password, settings.BCRYPT_ROUNDS)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -84,15 +116,38 @@ def create_user(db: Session, user: UserCreate) -> User:
     db.refresh(db_user)
     return db_user
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
+async def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
     """Authenticate user by email and password"""
     user = get_user_by_email(db, email)
-    if not user or not verify_password(password, user.hashed_password):
+    if not user:
+        # Burn the same bcrypt time as a real check so response timing doesn't reveal which emails exist
+        await run_in_bcrypt_pool(verify_password, password, DUMMY_HASH)
+        return None
+
+    # Skip bcrypt if this exact login succeeded against the current hash recently
+    cache_key = _login_cache_key(email, password)
+    with _verified_logins_lock:
+        if _verified_logins.get(cache_key) == user.hashed_password:
+            return user
+
+    if not await run_in_bcrypt_pool(verify_password, password, user.hashed_password):
         return None
+
+    # Upgrade legacy or differently-costed hashes now that we know the password
+    if needs_rehash(user.hashed_password, settings.BCRYPT_ROUNDS):
+        try:
+            user.hashed_password = await run_in_bcrypt_pool(hash_password, password, settings.BCRYPT_ROUNDS)
+            db.commit()
+        except Exception as e:
+            print(f"⚠️ Password rehash failed for user {user.id}: {e}")
+            db.rollback()
+
+    with _verified_logins_lock:
+        _verified_logins[cache_key] = user.hashed_password
     return user
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Get current user from JWT token"""
+def _decode_token(token: str) -> dict:
+    """Decode and verify a JWT, raising 401 on anything invalid"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -100,25 +155,61 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     )
     
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
+        return jwt.decode(token, settings.SECRET_KEY, **_JWT_DECODE_OPTIONS)
     except jwt.PyJWTError:
         raise credentials_exception
+
+def _load_user(db: Session, payload: dict) -> User:
+    """Fetch the ORM user a token refers to"""
+    uid = payload.get("uid")
+    if uid is not None:
+        user = db.get(User, uid)
+    else:
+        # Tokens issued before claims carried the user id
+        user = get_user_by_username(db, username=payload["sub"])
     
-    user = get_user_by_username(db, username=token_data.username)
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> UserCtx:
+    """Get current user from JWT claims, touching the database only for old tokens"""
+    payload = _decode_token(token)
+    uid = payload.get("uid")
+    
+    # Fresh tokens are trusted as-is; rechecking older ones bounds how long a deactivated account keeps access
+    issued_at = payload.get("iat", 0)
+    if uid is not None and time.time() - issued_at < settings.TOKEN_RECHECK_MINUTES * 60:
+        return UserCtx(id=uid, username=payload["sub"], is_active=payload.get("active", True))
+    
+    if uid is not None and uid in _user_ctx_cache:
+        return _user_ctx_cache[uid]
+    
+    user = _load_user(db, payload)
+    user_ctx = UserCtx(id=user.id, username=user.username, is_active=user.is_active)
+    _user_ctx_cache[user.id] = user_ctx
+    return user_ctx
+
+async def get_current_user_db(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+    """Get current user as an ORM object, for endpoints that need the full row"""
+    return _load_user(db, _decode_token(token))
+
+async def get_current_active_user(current_user: UserCtx = Depends(get_current_user)) -> UserCtx:
     """Get current active user"""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+async def get_current_active_user_db(current_user: User = Depends(get_current_user_db)) -> User:
+    """Get current active user as an ORM object"""
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
 # Routes
 @router.post("/register", response_model=UserResponse)
 async def register_user(user: UserCreate, db: Session = Depends(get_db)):
@@ -145,8 +236,8 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
     
     # Create new user
     try:
-        db_user = create_user(db, user)
-        return UserResponse.from_orm(db_user)
+        db_user = await create_user(db, user)
+        return user_response(db_user)
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -157,7 +248,7 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
 async def login_user(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """Login user with Gmail and password"""
     # Authenticate user (form_data.username should be email)
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -166,21 +257,20 @@ async def login_user(form_data: OAuth2PasswordRequestForm = Depends(), db: Sessi
         )
     
     # Create access token
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "uid": user.id, "active": user.is_active}
     )
     
     return {
         "access_token": access_token,
         "token_type": "bearer",
-        "user": UserResponse.from_orm(user)
+        "user": user_response(user)
     }
 
 @router.get("/me", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_active_user)):
+async def read_users_me(current_user: User = Depends(get_current_active_user_db)):
     """Get current user profile"""
-    return UserResponse.from_orm(current_user)
+    return user_response(current_user)
 
 @router.get("/health")
 async def auth_health():
@@ -188,6 +278,6 @@ async def auth_health():
     return {"status": "healthy", "service": "authentication"}
 
 @router.post("/logout")
-async def logout_user(current_user: User = Depends(get_current_active_user)):
+async def logout_user(current_user: UserCtx = Depends(get_current_active_user)):
     """Logout user (client should delete token)"""
     return {"message": "Successfully logged out"}
\ No newline at end of file
@@ -1,13 +1,17 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Depends, Response, status
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import String, func, insert, select, text, tuple_, type_coerce
 from sqlalchemy.orm import Session
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
+from functools import lru_cache
+import base64
+from cachetools import TTLCache
 from app.services.mood_analyzer import mood_analyzer
 from app.core.database import get_db
-from app.models.user import User
 from app.models.mood_entry import MoodEntry
-from app.api.auth import get_current_active_user
+from app.api.auth import UserCtx, get_current_active_user
 from app.services.jamendo_service import jamendo_service  # ADD THIS LINE
 
 router = APIRouter()
@@ -45,6 +49,61 @@ class MoodEntryResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# Per-user /stats payloads; entries are dropped whenever the user's moods change
+_stats_cache = TTLCache(maxsize=10_000, ttl=300)
+
+def _cache_stats(user_id: int, stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Remember a freshly computed stats payload and return it"""
+    _stats_cache[user_id] = stats
+    return stats
+
+def _invalidate_stats(user_id: int) -> None:
+    """Forget cached stats after a write to the user's mood entries"""
+    _stats_cache.pop(user_id, None)
+
+class MoodHistoryPage(BaseModel):
+    entries: List[MoodEntryResponse]
+    next_cursor: Optional[str] = None
+
+# Only the columns the history response needs, selected as plain rows
+_HISTORY_COLUMNS = tuple(getattr(MoodEntry, name) for name in MoodEntryResponse.model_fields)
+
+# One compiled serializer for the whole entry list
+_HISTORY_ADAPTER = TypeAdapter(List[MoodEntryResponse])
+
+def _encode_cursor(created_at: datetime, entry_id: int) -> str:
+    """Opaque history cursor holding the (created_at, id) of the last entry of a page"""
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{entry_id}".encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Recover the (created_at, id) position from a history cursor"""
+    try:
+        created_at, entry_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(entry_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid history cursor")
+
+def _sqlite_timestamp(ts: datetime) -> str:
+    """A timestamp in SQLite's stored text form (the server default has no fraction)"""
+    return ts.strftime("%Y-%m-%d %H:%M:%S.%f" if ts.microsecond else "%Y-%m-%d %H:%M:%S")
+
+def _history_query(db: Session, user_id: int, after: Optional[Tuple[datetime, int]], limit: int):
+    """Newest-first history rows for the user, resuming after a decoded cursor position if given"""
+    query = select(*_HISTORY_COLUMNS).where(MoodEntry.user_id == user_id)
+    
+    if after:
+        # Keyset pagination: resume strictly after the cursor position in (created_at, id) order.
+        # The position is carried in the cursor itself, so it still works if that entry was deleted
+        after_created_at, after_id = after
+        if db.get_bind().dialect.name == "sqlite":
+            # SQLite compares timestamps as text: bind the cursor in the stored format and keep the
+            # bare column on the left so ix_moods_user_created can seek on created_at
+            after_created_at = type_coerce(_sqlite_timestamp(after_created_at), String)
+        # A row-value comparison, unlike the equivalent OR, lets the planner range-seek on created_at
+        query = query.where(tuple_(MoodEntry.created_at, MoodEntry.id) < tuple_(after_created_at, after_id))
+    
+    return query.order_by(MoodEntry.created_at.desc(), MoodEntry.id.desc()).limit(limit)
+
 # PUBLIC ENDPOINT - Main mood analysis (no auth required)
 @router.post("/analyze", response_model=MoodAnalysisResponse)
 async def analyze_mood_public(request: MoodAnalysisRequest):
@@ -67,7 +126,7 @@ async def analyze_mood_public(request: MoodAnalysisRequest):
 @router.post("/analyze-and-save", response_model=MoodAnalysisResponse)
 async def analyze_and_save_mood(
     request: MoodAnalysisRequest,
-    current_user: User = Depends(get_current_active_user),
+    current_user: UserCtx = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -85,13 +144,13 @@ async def analyze_and_save_mood(
         playlist = None
         if request.include_music:
             print(f"🎵 Generating personalized playlist for user {current_user.username}...")
-            playlist = jamendo_service.get_mood_playlist(analysis, limit=10)
+            playlist = await jamendo_service.get_mood_playlist(analysis, limit=10)
             print(f"🎵 Playlist result: {playlist.get('total_tracks', 0) if playlist else 'None'} tracks")  # ADD THIS
             print(f"🎵 Playlist object: {playlist is not None}")  # ADD THIS        
         # END OF NEW LINES
         
-        # Save mood entry to database
-        mood_entry = MoodEntry(
+        # Save mood entry to database (RETURNING the id saves a refresh round trip)
+        insert_entry = insert(MoodEntry).values(
             user_id=current_user.id,
             text_content=request.text.strip(),
             sentiment=analysis.get("sentiment"),
@@ -103,13 +162,13 @@ async def analyze_and_save_mood(
             art_style=analysis.get("art_style"),
             music_mood=analysis.get("music_mood"),
             ai_insight=analysis.get("ai_insight")
-        )
+        ).returning(MoodEntry.id)
         
-        db.add(mood_entry)
+        entry_id = db.execute(insert_entry).scalar_one()
         db.commit()
-        db.refresh(mood_entry)
+        _invalidate_stats(current_user.id)
         
-        print(f"✅ Mood entry saved for user {current_user.username} (ID: {mood_entry.id})")
+        print(f"✅ Mood entry saved for user {current_user.username} (ID: {entry_id})")
         print(f"🎵 Returning playlist with response: {playlist is not None}")  # ADD THIS
 
         return MoodAnalysisResponse(**analysis, playlist=playlist)  # RETURN PLAYLIST HERE IF GENERATED
@@ -120,83 +179,129 @@ async def analyze_and_save_mood(
         raise HTTPException(status_code=500, detail="Failed to analyze and save mood")
 
 # AUTHENTICATED ENDPOINTS - Personal features
-@router.get("/history", response_model=List[MoodEntryResponse])
+@router.get("/history", response_model=MoodHistoryPage, response_class=ORJSONResponse)
 async def get_mood_history(
     limit: int = 20,
-    skip: int = 0,
-    current_user: User = Depends(get_current_active_user),
+    after: Optional[str] = None,
+    current_user: UserCtx = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
-    AUTHENTICATED: Get user's mood history
+    AUTHENTICATED: Get user's mood history, newest first.
+    Pass the returned next_cursor as `after` to fetch the following page.
     """
+    position = _decode_cursor(after) if after else None
+    
     try:
-        mood_entries = db.query(MoodEntry)\
-            .filter(MoodEntry.user_id == current_user.id)\
-            .order_by(MoodEntry.created_at.desc())\
-            .offset(skip)\
-            .limit(limit)\
-            .all()
+        # One extra row tells us whether another page exists
+        rows = db.execute(
+            _history_query(db, current_user.id, position, limit + 1)
+        ).mappings().all()
+        
+        # Rows come straight from our own table, so skip re-validation
+        entries = [MoodEntryResponse.model_construct(**row) for row in rows[:limit]]
+        next_cursor = _encode_cursor(entries[-1].created_at, entries[-1].id) if len(rows) > limit and entries else None
         
-        return [MoodEntryResponse.from_orm(entry) for entry in mood_entries]
+        # Serialize the list in one pass and bypass FastAPI's per-item response re-validation
+        return ORJSONResponse({
+            "entries": _HISTORY_ADAPTER.dump_python(entries, mode="json"),
+            "next_cursor": next_cursor
+        })
     
     except Exception as e:
         print(f"Error fetching mood history: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch mood history")
 
+# Sums each emotion's score inside the database instead of shipping the JSON blobs
+_PG_TOP_EMOTIONS_SQL = text("""
+    SELECT kv.key, SUM(kv.value::float) AS total
+    FROM mood_entries, jsonb_each_text(mood_entries.emotions::jsonb) AS kv(key, value)
+    WHERE mood_entries.user_id = :user_id
+      AND jsonb_typeof(mood_entries.emotions::jsonb) = 'object'
+    GROUP BY kv.key
+    ORDER BY total DESC
+    LIMIT :limit
+""")
+
+def _top_emotions(db: Session, user_id: int, limit: int = 5) -> List[tuple]:
+    """Return the (emotion, total_score) pairs with the highest summed scores"""
+    if db.get_bind().dialect.name == "postgresql":
+        rows = db.execute(_PG_TOP_EMOTIONS_SQL, {"user_id": user_id, "limit": limit}).all()
+        return [(emotion, total) for emotion, total in rows]
+    
+    # Portable fallback (SQLite): only the emotions column is loaded
+    emotion_rows = db.query(MoodEntry.emotions)\
+        .filter(MoodEntry.user_id == user_id, MoodEntry.emotions.isnot(None))\
+        .all()
+    
+    emotion_totals = {}
+    for (emotions,) in emotion_rows:
+        if emotions:
+            for emotion, score in emotions.items():
+                emotion_totals[emotion] = emotion_totals.get(emotion, 0) + score
+    
+    return sorted(emotion_totals.items(), key=lambda x: x[1], reverse=True)[:limit]
+
 @router.get("/stats")
 async def get_mood_stats(
-    current_user: User = Depends(get_current_active_user),
+    response: Response,
+    current_user: UserCtx = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
     AUTHENTICATED: Get user's mood statistics
     """
+    response.headers["Cache-Control"] = "private, max-age=60"
+    
+    cached = _stats_cache.get(current_user.id)
+    if cached is not None:
+        return cached
+    
     try:
-        entries = db.query(MoodEntry)\
+        # Sentiment distribution (counted in SQL, no rows shipped to Python)
+        sentiment_rows = db.query(MoodEntry.sentiment, func.count())\
             .filter(MoodEntry.user_id == current_user.id)\
+            .group_by(MoodEntry.sentiment)\
             .all()
         
-        if not entries:
-            return {
+        if not sentiment_rows:
+            return _cache_stats(current_user.id, {
                 "total_entries": 0,
                 "sentiment_distribution": {},
                 "energy_distribution": {},
                 "most_common_emotions": [],
                 "streak_days": 0
-            }
+            })
         
         # Calculate statistics
-        total_entries = len(entries)
+        total_entries = sum(count for _, count in sentiment_rows)
         
-        # Sentiment distribution
         sentiment_counts = {}
-        for entry in entries:
-            sentiment = entry.sentiment or "unknown"
-            sentiment_counts[sentiment] = sentiment_counts.get(sentiment, 0) + 1
+        for sentiment, count in sentiment_rows:
+            sentiment = sentiment or "unknown"
+            sentiment_counts[sentiment] = sentiment_counts.get(sentiment, 0) + count
         
         # Energy distribution
+        energy_rows = db.query(MoodEntry.energy_level, func.count())\
+            .filter(MoodEntry.user_id == current_user.id)\
+            .group_by(MoodEntry.energy_level)\
+            .all()
+        
         energy_counts = {}
-        for entry in entries:
-            energy = entry.energy_level or "unknown"
-            energy_counts[energy] = energy_counts.get(energy, 0) + 1
+        for energy, count in energy_rows:
+            energy = energy or "unknown"
+            energy_counts[energy] = energy_counts.get(energy, 0) + count
         
         # Most common emotions
-        emotion_totals = {}
-        for entry in entries:
-            if entry.emotions:
-                for emotion, score in entry.emotions.items():
-                    emotion_totals[emotion] = emotion_totals.get(emotion, 0) + score
+        most_common_emotions = _top_emotions(db, current_user.id)
         
-        most_common_emotions = sorted(emotion_totals.items(), key=lambda x: x[1], reverse=True)[:5]
-        
-        return {
+        return _cache_stats(current_user.id, {
             "total_entries": total_entries,
             "sentiment_distribution": sentiment_counts,
             "energy_distribution": energy_counts,
             "most_common_emotions": [{"emotion": emotion, "total_score": score} for emotion, score in most_common_emotions],
             "user": current_user.username
-        }
+        })
     
     except Exception as e:
         print(f"Error calculating mood stats: {e}")
@@ -204,7 +309,7 @@ async def get_mood_stats(
     
 @router.get("/weekly-summary")
 async def get_weekly_summary(
-    current_user: User = Depends(get_current_active_user),
+    current_user: UserCtx = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -213,6 +318,7 @@ async def get_weekly_summary(
     try:
         from datetime import timedelta
         from app.services.summary_service import generate_weekly_summary
+        from app.services.summary_batch_job import get_precomputed_summary
         
         # Get mood entries from the last 7 days
         seven_days_ago = datetime.utcnow() - timedelta(days=7)
@@ -231,6 +337,16 @@ async def get_weekly_summary(
                 "period": "last 7 days"
             }
         
+        # Use the nightly summary while it still covers exactly these entries
+        stored = get_precomputed_summary(db, current_user.id, entries)
+        if stored:
+            return {
+                "summary": stored.summary,
+                "entries_count": len(entries),
+                "period": "last 7 days",
+                "generated_at": stored.generated_at.isoformat()
+            }
+        
         # Generate summary using LLM
         summary = await generate_weekly_summary(entries)
         
@@ -248,7 +364,7 @@ async def get_weekly_summary(
 @router.delete("/entry/{entry_id}")
 async def delete_mood_entry(
     entry_id: int,
-    current_user: User = Depends(get_current_active_user),
+    current_user: UserCtx = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -264,6 +380,7 @@ async def delete_mood_entry(
         
         db.delete(entry)
         db.commit()
+        _invalidate_stats(current_user.id)
         
         return {"message": "Mood entry deleted successfully"}
     
@@ -278,7 +395,7 @@ async def delete_mood_entry(
 @router.get("/playlist/{entry_id}")
 async def get_mood_playlist(
     entry_id: int,
-    current_user: User = Depends(get_current_active_user),
+    current_user: UserCtx = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -303,7 +420,7 @@ async def get_mood_playlist(
         }
         
         # Generate playlist
-        playlist = jamendo_service.get_mood_playlist(mood_analysis, limit=10)
+        playlist = await jamendo_service.get_mood_playlist(mood_analysis, limit=10)
         
         return playlist
     
@@ -314,9 +431,9 @@ async def get_mood_playlist(
         raise HTTPException(status_code=500, detail="Failed to fetch music playlist")
 
 # Keep existing test and health endpoints
-@router.get("/test")
-async def test_mood_analysis():
-    """Test mood analysis with sample texts"""
+@lru_cache(maxsize=1)
+def _sample_analyses() -> List[Dict[str, Any]]:
+    """Analyze the /test sample texts once per process"""
     sample_texts = [
         "I'm feeling really happy and excited!",
         "I'm quite sad today",
@@ -324,14 +441,19 @@ async def test_mood_analysis():
     ]
     
     results = []
-    for text in sample_texts:
+    for sample in sample_texts:
         try:
-            analysis = mood_analyzer.analyze_full_mood(text)
-            results.append({"text": text, "analysis": analysis})
+            analysis = mood_analyzer.analyze_full_mood(sample)
+            results.append({"text": sample, "analysis": analysis})
         except Exception as e:
-            results.append({"text": text, "error": str(e)})
+            results.append({"text": sample, "error": str(e)})
     
-    return {"test_results": results, "status": "success"}
+    return results
+
+@router.get("/test")
+async def test_mood_analysis():
+    """Test mood analysis with sample texts"""
+    return {"test_results": _sample_analyses(), "status": "success"}
 
 @router.get("/health")
 async def mood_service_health():
@@ -339,9 +461,5 @@ async def mood_service_health():
     return {
         "status": "healthy",
         "service": "mood_analysis",
-        "models_loaded": {
-            "sentiment": mood_analyzer.sentiment_analyzer is not None,
-            "emotion": mood_analyzer.emotion_analyzer is not None,
-            "nlp": mood_analyzer.nlp is not None
-        }
+        "models_loaded": mood_analyzer.models_loaded()
     }
\ No newline at end of file
@@ -17,6 +17,13 @@ class Settings:
     SECRET_KEY: str = os.getenv("SECRET_KEY", "fallback-secret-key")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 24 hours
+    TOKEN_RECHECK_MINUTES: int = int(os.getenv("TOKEN_RECHECK_MINUTES", "15"))  # trust token claims without a DB lookup for this long
+    
+    # Password hashing (bcrypt cost factor; each +1 doubles login CPU)
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    
+    # Nightly weekly-summary precompute (hour of day, UTC)
+    SUMMARY_JOB_HOUR_UTC: int = int(os.getenv("SUMMARY_JOB_HOUR_UTC", "3"))
     
     # OpenAI
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
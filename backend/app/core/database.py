@@ -6,7 +6,7 @@
 # - Database dependency injection
 
 import os
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, event, make_url, MetaData
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
@@ -16,12 +16,31 @@ load_dotenv()
 # Database configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/moodboard.db")
 
+# In-memory SQLite gets SingletonThreadPool, which has no size/overflow settings
+_url = make_url(DATABASE_URL)
+_in_memory_sqlite = _url.get_backend_name() == "sqlite" and _url.database in (None, "", ":memory:")
+_pool_kwargs = {} if _in_memory_sqlite else {"pool_size": 20, "max_overflow": 20}
+
 # Create SQLAlchemy engine
 engine = create_engine(
     DATABASE_URL, 
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
+    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
+    **_pool_kwargs,
+    pool_pre_ping=True,
+    pool_recycle=1800
 )
 
+if "sqlite" in DATABASE_URL:
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, _):
+        """WAL lets readers run alongside the writer; mmap cuts read syscalls"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.close()
+
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -41,8 +60,13 @@ async def init_db():
     os.makedirs("data", exist_ok=True)
     
     # Import models to register them
-    from app.models import user, mood_entry
+    from app.models import user, mood_entry, weekly_summary, job_run
     
     # Create all tables
     Base.metadata.create_all(bind=engine)
+    
+    # create_all skips tables that already exist, so add any indexes they are missing
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
     print("✅ Database initialized successfully")
\ No newline at end of file
@@ -0,0 +1,54 @@
+# Password hashing helpers
+# Responsibilities:
+# - bcrypt hash/verify
+# - Process pool that keeps bcrypt off the event loop
+#
+# Kept free of app imports so spawned pool workers only load app.core and bcrypt.
+
+import base64
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt  # pyca/bcrypt >= 4.0 is a Rust extension, hashing already runs natively
+
+# Workers are only started on first submit, so importing this module is cheap.
+# "spawn" starts them from a fresh interpreter instead of forking the multithreaded
+# server process (and whatever models it has loaded)
+BCRYPT_POOL = ProcessPoolExecutor(
+    max_workers=max(1, (os.cpu_count() or 2) - 1),
+    mp_context=multiprocessing.get_context("spawn")
+)
+
+# Marks hashes whose input was SHA-256 pre-hashed; unmarked hashes are legacy raw bcrypt
+PREHASH_PREFIX = "sha256$"
+
+def _prehash(password: str) -> bytes:
+    """SHA-256 the password so bcrypt's 72-byte input limit never truncates it"""
+    return base64.b64encode(hashlib.sha256(password.encode('utf-8')).digest())
+
+def hash_password(password: str, rounds: int = 12) -> str:
+    """Hash a password using SHA-256 + bcrypt at the given cost"""
+    salt = bcrypt.gensalt(rounds=rounds)
+    return PREHASH_PREFIX + bcrypt.hashpw(_prehash(password), salt).decode('utf-8')
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash (pre-hashed or legacy); malformed hashes never match"""
+    try:
+        if hashed_password.startswith(PREHASH_PREFIX):
+            bcrypt_hash = hashed_password[len(PREHASH_PREFIX):]
+            return bcrypt.checkpw(_prehash(plain_password), bcrypt_hash.encode('utf-8'))
+        return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    except ValueError:
+        return False
+
+def needs_rehash(hashed_password: str, rounds: int) -> bool:
+    """True for legacy hashes, hashes made at a different cost, and hashes whose cost can't be read"""
+    if not hashed_password.startswith(PREHASH_PREFIX):
+        return True
+    # bcrypt hashes look like $2b$<cost>$<salt+digest>
+    try:
+        return int(hashed_password[len(PREHASH_PREFIX):].split("$")[2]) != rounds
+    except (IndexError, ValueError):
+        return True
@@ -1,6 +1,9 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import text
+import asyncio
+import time
 import uvicorn
 
 # Import routers
@@ -8,8 +11,12 @@ from app.api.moods import router as mood_router
 from app.api.auth import router as auth_router
 
 # Import database and config
-from app.core.database import init_db, get_db
+from app.core.database import init_db, engine
 from app.core.config import settings
+from app.core.security import BCRYPT_POOL
+from app.services.jamendo_service import jamendo_service
+from app.services import summary_service
+from app.services.summary_batch_job import run_nightly
 
 # Create FastAPI app
 app = FastAPI(
@@ -17,7 +24,8 @@ app = FastAPI(
     description="AI-powered mood analysis and creative content generation",
     version="1.3.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -25,8 +33,9 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.ALLOWED_ORIGINS,
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "DELETE"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400,  # let browsers cache preflight responses for a day
 )
 
 # Include routers
@@ -38,8 +47,19 @@ async def startup_event():
     """Initialize database on startup"""
     print("🚀 Starting MoodBoard AI API...")
     await init_db()
+    
+    # Nightly weekly-summary precompute; kept on app.state so shutdown can cancel it
+    app.state.summary_job = asyncio.create_task(run_nightly())
     print("✅ API ready at http://localhost:8000")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background workers on shutdown"""
+    app.state.summary_job.cancel()
+    BCRYPT_POOL.shutdown(wait=False, cancel_futures=True)
+    await jamendo_service.aclose()
+    await summary_service.aclose()
+
 @app.get("/")
 async def root():
     """API root endpoint"""
@@ -50,15 +70,33 @@ async def root():
         "health": "/health"
     }
 
-@app.get("/health")
-async def health_check(db: Session = Depends(get_db)):
-    """Health check endpoint"""
+# Last database ping as (monotonic timestamp, status); probes within 5s reuse it
+_db_ping = (0.0, "unknown")
+DB_PING_TTL_SECONDS = 5
+
+def _database_status() -> str:
+    """Ping the database on a bare pooled connection, at most every few seconds"""
+    global _db_ping
+    checked_at, db_status = _db_ping
+    now = time.monotonic()
+    if checked_at and now - checked_at < DB_PING_TTL_SECONDS:
+        return db_status
+    
     try:
-        db.execute("SELECT 1")
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
         db_status = "healthy"
     except Exception as e:
         db_status = f"unhealthy: {str(e)}"
     
+    _db_ping = (now, db_status)
+    return db_status
+
+@app.get("/health")
+async def health_check():
+    """Health check endpoint"""
+    db_status = _database_status()
+    
     return {
         "status": "healthy",
         "database": db_status,
@@ -1,2 +1,4 @@
 from .user import User
-from .mood_entry import MoodEntry
\ No newline at end of file
+from .mood_entry import MoodEntry
+from .weekly_summary import WeeklySummary
+from .job_run import JobRun
\ No newline at end of file
@@ -0,0 +1,17 @@
+# SQLAlchemy model for background job runs
+# Responsibilities:
+# - Record which process claimed a scheduled job for a given day
+# - Let exactly one uvicorn worker run each nightly job
+
+from sqlalchemy import Column, String, Date, DateTime
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class JobRun(Base):
+    __tablename__ = "job_runs"
+
+    # One row per job per day: the first worker to insert it runs the job
+    name = Column(String(50), primary_key=True)
+    run_date = Column(Date, primary_key=True)
+
+    claimed_at = Column(DateTime(timezone=True), server_default=func.now())
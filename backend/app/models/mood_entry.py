@@ -4,7 +4,8 @@
 # - Store analysis results
 # - Link to users
 
-from sqlalchemy import Column, Integer, String, Text, Float, JSON, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Float, JSON, DateTime, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -22,7 +23,7 @@ class MoodEntry(Base):
     sentiment = Column(String(20), nullable=True)
     sentiment_confidence = Column(Float, nullable=True)
     energy_level = Column(String(10), nullable=True)
-    emotions = Column(JSON, nullable=True)  # {"joy": 0.8, "sadness": 0.1}
+    emotions = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)  # {"joy": 0.8, "sadness": 0.1}
     keywords = Column(JSON, nullable=True)  # ["happy", "excited"]
     
     # Generated content
@@ -36,4 +37,9 @@ class MoodEntry(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationship with user
-    user = relationship("User", back_populates="mood_entries")
\ No newline at end of file
+    user = relationship("User", back_populates="mood_entries")
+    
+    # History is always read per user, newest first; the user_id prefix also serves /stats
+    __table_args__ = (
+        Index("ix_moods_user_created", user_id, created_at.desc()),
+    )
\ No newline at end of file
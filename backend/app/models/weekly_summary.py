@@ -0,0 +1,20 @@
+# SQLAlchemy model for precomputed weekly summaries
+# Responsibilities:
+# - Store the nightly Llama summary per user
+# - Record which entries it covered so stale summaries are skipped
+
+from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class WeeklySummary(Base):
+    __tablename__ = "weekly_summaries"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    summary = Column(Text, nullable=False)
+    
+    # The 7-day window the summary was written for: still valid while these match
+    entries_count = Column(Integer, nullable=False)
+    last_entry_id = Column(Integer, nullable=False)
+    
+    generated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
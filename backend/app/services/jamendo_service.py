@@ -1,7 +1,16 @@
 # backend/app/services/jamendo_service.py
+import asyncio
 import os
+import random
+import threading
+import time
+import httpx
+import orjson
 import requests
-from typing import List, Dict, Any, Optional
+from requests.adapters import HTTPAdapter
+from cachetools import TTLCache
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,6 +20,7 @@ class JamendoService:
     
     BASE_URL = "https://api.jamendo.com/v3.0"
     CLIENT_ID = os.getenv("JAMENDO_CLIENT_ID", "")
+    MAX_ATTEMPTS = 3  # per request, for transient errors only
     
     # Mood to music tag mapping
     MOOD_TAG_MAP = {
@@ -40,80 +50,186 @@ class JamendoService:
         "cool": ["ambient", "chillwave", "synthwave", "electronic"]
     }
     
+    # Playlist name per mood: (template, fallback for {emotion}, or None when the name is fixed)
+    PLAYLIST_NAMES = {
+        "positive-high": ("Energized & {emotion}", "Joyful"),
+        "positive-low": ("Peaceful {emotion}", "Calm"),
+        "negative-high": ("Intense {emotion}", "Power"),
+        "negative-low": ("Reflective {emotion}", "Melancholy"),
+        "neutral-high": ("Focused Flow", None),
+        "neutral-low": ("Chill Zone", None)
+    }
+    
+    # Ask for compressed JSON explicitly; some builds don't advertise gzip on their own
+    HTTP_HEADERS = {"Accept-Encoding": "gzip", "User-Agent": "moodboard-ai/1.3"}
+    
     def __init__(self):
         if not self.CLIENT_ID:
             print("⚠️ WARNING: JAMENDO_CLIENT_ID not set. Music features will be limited.")
+        
+        # Shared keep-alive pool so search retries and concurrent users reuse the TLS connection
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0))
+        self._session.headers.update(self.HTTP_HEADERS)
+        
+        # Similar moods often resolve to the same tags; popularity ordering is fine a couple of minutes stale
+        self._search_cache = TTLCache(maxsize=256, ttl=120)
+        self._search_cache_lock = threading.Lock()
+        # Async playlist searches multiplex over one HTTP/2 connection
+        self._async_client = httpx.AsyncClient(
+            http2=True,
+            timeout=10,
+            headers=self.HTTP_HEADERS,
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=4)
+        )
     
-    def _make_request(self, endpoint: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Make API request to Jamendo"""
-        try:
-            params["client_id"] = self.CLIENT_ID
-            params["format"] = "jsonpretty"
-            
-            response = requests.get(f"{self.BASE_URL}/{endpoint}", params=params, timeout=10)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Jamendo API error: {e}")
+    async def aclose(self) -> None:
+        """Close pooled HTTP connections"""
+        await self._async_client.aclose()
+        self._session.close()
+    
+    @staticmethod
+    def _is_recoverable(error: Exception) -> bool:
+        """Network failures, timeouts, 429 and 5xx are worth retrying; other errors are not"""
+        if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, httpx.TransportError)):
+            return True
+        if isinstance(error, (requests.exceptions.HTTPError, httpx.HTTPStatusError)) and error.response is not None:
+            status_code = error.response.status_code
+            return status_code == 429 or status_code >= 500
+        return False
+    
+    def _retry_delay(self, attempt: int, error: Exception) -> Optional[float]:
+        """Backoff before the next attempt, or None (after logging) when the error is final"""
+        if not self._is_recoverable(error) or attempt == self.MAX_ATTEMPTS - 1:
+            print(f"❌ Jamendo API error (attempt {attempt + 1}/{self.MAX_ATTEMPTS}): {error}")
             return None
+        
+        delay = min(30.0, 1.0 * (2 ** attempt) * (1 + random.random() * 0.5))
+        print(f"⚠️ Jamendo API error (attempt {attempt + 1}/{self.MAX_ATTEMPTS}): {error}, retrying in {delay:.1f}s")
+        return delay
+    
+    def _make_request(self, endpoint: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Make API request to Jamendo, retrying transient failures with backoff"""
+        params["client_id"] = self.CLIENT_ID
+        params["format"] = "json"  # compact; nothing reads the pretty-printed whitespace
+        
+        for attempt in range(self.MAX_ATTEMPTS):
+            try:
+                response = self._session.get(f"{self.BASE_URL}/{endpoint}", params=params, timeout=10)
+                response.raise_for_status()
+                return orjson.loads(response.content)
+            except orjson.JSONDecodeError as e:
+                print(f"❌ Jamendo API returned invalid JSON: {e}")
+                return None
+            except requests.exceptions.RequestException as e:
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    return None
+                time.sleep(delay)
+        
+        return None
+    
+    async def _make_request_async(self, endpoint: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Async variant of _make_request for use on the event loop"""
+        params["client_id"] = self.CLIENT_ID
+        params["format"] = "json"
+        
+        for attempt in range(self.MAX_ATTEMPTS):
+            try:
+                response = await self._async_client.get(f"{self.BASE_URL}/{endpoint}", params=params)
+                response.raise_for_status()
+                return orjson.loads(response.content)
+            except orjson.JSONDecodeError as e:
+                print(f"❌ Jamendo API returned invalid JSON: {e}")
+                return None
+            except httpx.HTTPError as e:
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    return None
+                await asyncio.sleep(delay)
+        
+        return None
     
     def _analyze_color_palette(self, colors: List[str]) -> str:
         """Analyze color palette to determine intensity/vibe"""
-        # Simple heuristic based on color brightness/saturation
-        # This is a basic implementation - could be enhanced with proper color analysis
         if not colors:
             return "neutral"
+        # Palettes come from a small fixed table, so classify each distinct one only once
+        return self._classify_palette(tuple(colors))
+    
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def _classify_palette(colors: Tuple[str, ...]) -> str:
+        """Classify a palette by its mean brightness and saturation (max - min channel)"""
+        brightness = 0
+        saturation = 0
+        count = 0
+        for color in colors:
+            hex_value = color.lstrip('#')
+            if len(hex_value) == 3:
+                hex_value = "".join(ch * 2 for ch in hex_value)
+            try:
+                rgb = int(hex_value, 16)
+            except ValueError:
+                continue
+            r, g, b = (rgb >> 16) & 0xFF, (rgb >> 8) & 0xFF, rgb & 0xFF
+            brightness += r + g + b
+            saturation += max(r, g, b) - min(r, g, b)
+            count += 1
         
-        # Check if colors are vibrant (high saturation)
-        vibrant_count = sum(1 for c in colors if any(x in c.lower() for x in ['ff', 'ee', 'dd']))
+        if not count:
+            return "neutral"
         
-        if vibrant_count > len(colors) * 0.6:
+        mean_brightness = brightness / (3 * count)
+        mean_saturation = saturation / count
+        if mean_saturation >= 140:
             return "vibrant"
-        elif vibrant_count < len(colors) * 0.3:
-            return "pastel"
-        
-        # Check for dark/light colors
-        dark_count = sum(1 for c in colors if c.startswith('#') and int(c[1:3], 16) < 100)
-        if dark_count > len(colors) * 0.5:
+        if mean_brightness < 130:
             return "dark"
-        
+        if mean_brightness >= 170:
+            return "pastel"
         return "neutral"
     
-    def _get_tags_from_mood(self, mood_analysis: Dict[str, Any]) -> List[str]:
-        """Extract relevant music tags from mood analysis"""
+    @classmethod
+    @lru_cache(maxsize=256)
+    def _compose_tags(cls, mood_key: str, dominant_emotion: Optional[str], color_vibe: str) -> Tuple[str, ...]:
+        """Combine the tag tables for one mood; the tables are constant, so results are memoized"""
         tags = []
         
         # 1. Get tags from sentiment-energy combination
+        tags.extend(cls.MOOD_TAG_MAP.get(mood_key, ["chill"]))
+        
+        # 2. Get tags from dominant emotion
+        if dominant_emotion:
+            tags.extend(cls.MOOD_TAG_MAP.get(dominant_emotion, []))
+        
+        # 3. Add genre based on color palette
+        tags.extend(cls.COLOR_INTENSITY_GENRES.get(color_vibe, []))
+        
+        # Remove duplicates while preserving order, keep the top 5 most relevant tags
+        return tuple(dict.fromkeys(tags))[:5]
+    
+    @staticmethod
+    def _dominant_emotion(mood_analysis: Dict[str, Any]) -> Optional[str]:
+        """Dominant emotion as computed by the analyzer, derived here for stored entries that lack it"""
+        if "dominant_emotion" in mood_analysis:
+            return mood_analysis["dominant_emotion"]
+        emotions = mood_analysis.get("emotions") or {}
+        return max(emotions, key=emotions.get) if emotions else None
+
+    def _get_tags_from_mood(self, mood_analysis: Dict[str, Any]) -> List[str]:
+        """Extract relevant music tags from mood analysis"""
         sentiment = mood_analysis.get("sentiment", "neutral")
         energy = mood_analysis.get("energy_level", "low")
         mood_key = f"{sentiment}-{energy}"
         
-        tags.extend(self.MOOD_TAG_MAP.get(mood_key, ["chill"]))
+        dominant_emotion = self._dominant_emotion(mood_analysis)
         
-        # 2. Get tags from dominant emotion
-        emotions = mood_analysis.get("emotions", {})
-        if emotions:
-            dominant_emotion = max(emotions.items(), key=lambda x: x[1])[0]
-            emotion_tags = self.MOOD_TAG_MAP.get(dominant_emotion, [])
-            tags.extend(emotion_tags)
+        color_vibe = self._analyze_color_palette(mood_analysis.get("color_palette", []))
         
-        # 3. Add genre based on color palette
-        color_palette = mood_analysis.get("color_palette", [])
-        color_vibe = self._analyze_color_palette(color_palette)
-        if color_vibe in self.COLOR_INTENSITY_GENRES:
-            tags.extend(self.COLOR_INTENSITY_GENRES[color_vibe])
-        
-        # Remove duplicates while preserving order
-        seen = set()
-        unique_tags = []
-        for tag in tags:
-            if tag not in seen:
-                seen.add(tag)
-                unique_tags.append(tag)
-        
-        return unique_tags[:5]  # Limit to top 5 most relevant tags
+        return list(self._compose_tags(mood_key, dominant_emotion, color_vibe))
     
-    def get_mood_playlist(
+    async def get_mood_playlist(
         self, 
         mood_analysis: Dict[str, Any], 
         limit: int = 10
@@ -129,42 +245,96 @@ class JamendoService:
             Dictionary with playlist info and tracks
         """
         if not self.CLIENT_ID:
-            print("❌ No Jamendo CLIENT_ID found!")  # ADD THIS
-            return {
-                "error": "Jamendo API not configured",
-                "playlist_name": "Mood Playlist",
-                "tracks": []
-            }
+            return self._unconfigured_playlist()
         
         # Extract relevant tags from mood
         tags = self._get_tags_from_mood(mood_analysis)
         print(f"🎵 Searching Jamendo with tags: {tags}")  # ADD THIS
         
-        # Try progressively broader searches if no results
+        # The two narrowest searches run together; broader ones only if both come back empty
+        search_attempts = self._search_attempts(tags)
+        first_attempts = search_attempts[:2]
+        first_results = await asyncio.gather(*(
+            self._search_tracks_async(attempt_tags, limit)
+            for attempt_tags in first_attempts
+        ))
+        
         data = None
+        for attempt_tags, data in zip(first_attempts, first_results):
+            if self._has_tracks(data, attempt_tags):
+                break
+        else:
+            for attempt_tags in search_attempts[2:]:
+                data = await self._search_tracks_async(attempt_tags, limit)
+                if self._has_tracks(data, attempt_tags):
+                    break
+        
+        return self._build_playlist(mood_analysis, tags, data)
+    
+    @staticmethod
+    def _unconfigured_playlist() -> Dict[str, Any]:
+        print("❌ No Jamendo CLIENT_ID found!")  # ADD THIS
+        return {
+            "error": "Jamendo API not configured",
+            "playlist_name": "Mood Playlist",
+            "tracks": []
+        }
+    
+    @staticmethod
+    def _search_attempts(tags: List[str]) -> List[List[str]]:
+        """Progressively broader tag searches, skipping duplicates when there are few tags"""
         search_attempts = [
             tags[:3],  # Try first 3 tags
             tags[:2],  # Try first 2 tags
             tags[:1],  # Try first tag only
             ["instrumental"],  # Fallback to instrumental
         ]
-
-        for attempt_tags in search_attempts:
-            params = {
-                "tags": ",".join(attempt_tags),
-                "limit": limit,
-                "order": "popularity_total",
-                "audioformat": "mp32",
-                "include": "musicinfo+licenses"
-            }
-
-            data = self._make_request("tracks/", params)
-            if data and "results" in data and data["results"]:
-                print(f"✅ Found {len(data['results'])} tracks with tags: {attempt_tags}")  # ADD THIS
-                break  # Found results, exit loop
-            else:
-                print(f"⚠️ No tracks found with tags: {attempt_tags}, trying broader search...")  # ADD THIS
-
+        return [list(attempt) for attempt in dict.fromkeys(map(tuple, search_attempts))]
+    
+    def _cached_search(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        with self._search_cache_lock:
+            return self._search_cache.get(key)
+    
+    def _cache_search(self, key: Tuple, data: Optional[Dict[str, Any]]) -> None:
+        # Failed requests aren't cached so the next user retries them
+        if data is not None:
+            with self._search_cache_lock:
+                self._search_cache[key] = data
+    
+    async def _search_tracks_async(self, attempt_tags: List[str], limit: int) -> Optional[Dict[str, Any]]:
+        """Tag search, served from the short-lived search cache when possible"""
+        key = (tuple(attempt_tags), limit, "popularity_total")
+        data = self._cached_search(key)
+        if data is None:
+            data = await self._make_request_async("tracks/", self._search_params(attempt_tags, limit))
+            self._cache_search(key, data)
+        return data
+    
+    @staticmethod
+    def _search_params(attempt_tags: List[str], limit: int) -> Dict[str, Any]:
+        return {
+            "tags": ",".join(attempt_tags),
+            "limit": limit,
+            "order": "popularity_total",
+            "audioformat": "mp32",
+            "include": "licenses"  # musicinfo isn't read and bloats the payload
+        }
+    
+    @staticmethod
+    def _has_tracks(data: Optional[Dict[str, Any]], attempt_tags: List[str]) -> bool:
+        if data and "results" in data and data["results"]:
+            print(f"✅ Found {len(data['results'])} tracks with tags: {attempt_tags}")  # ADD THIS
+            return True
+        print(f"⚠️ No tracks found with tags: {attempt_tags}, trying broader search...")  # ADD THIS
+        return False
+    
+    def _build_playlist(
+        self, 
+        mood_analysis: Dict[str, Any], 
+        tags: List[str], 
+        data: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Shape the last search response into the playlist returned to the frontend"""
         print(f"📊 Jamendo API response: {data is not None}")  # ADD THIS
         if data:
             print(f"📊 Number of tracks returned: {len(data.get('results', []))}")  # ADD THIS
@@ -179,19 +349,7 @@ class JamendoService:
             }
         
         # Format tracks for frontend
-        tracks = []
-        for track in data["results"]:
-            tracks.append({
-                "id": track.get("id"),
-                "name": track.get("name"),
-                "artist": track.get("artist_name"),
-                "album": track.get("album_name"),
-                "duration": track.get("duration"),  # in seconds
-                "audio_url": track.get("audio"),
-                "image_url": track.get("image"),
-                "jamendo_url": f"https://www.jamendo.com/track/{track.get('id')}",
-                "license": track.get("license_ccurl"),
-            })
+        tracks = [self._format_track(track) for track in data["results"]]
 
         print(f"✅ Formatted {len(tracks)} tracks for frontend")  # ADD THIS
         
@@ -204,55 +362,40 @@ class JamendoService:
             "energy": mood_analysis.get("energy_level"),
         }
     
+    @staticmethod
+    def _format_track(track: Dict[str, Any], full: bool = True) -> Dict[str, Any]:
+        """Shape a Jamendo track for the frontend; full adds album, duration and links"""
+        get = track.get
+        track_id = get("id")
+        formatted = {
+            "id": track_id,
+            "name": get("name"),
+            "artist": get("artist_name"),
+            "audio_url": get("audio"),
+            "image_url": get("image"),
+        }
+        if full:
+            formatted["album"] = get("album_name")
+            formatted["duration"] = get("duration")  # in seconds
+            formatted["jamendo_url"] = f"https://www.jamendo.com/track/{track_id}"
+            formatted["license"] = get("license_ccurl")
+        return formatted
+    
     def _generate_playlist_name(self, mood_analysis: Dict[str, Any]) -> str:
         """Generate a creative playlist name based on mood"""
-        sentiment = mood_analysis.get("sentiment", "neutral").capitalize()
-        energy = mood_analysis.get("energy_level", "low").capitalize()
-        
-        # Get dominant emotion if available
-        emotions = mood_analysis.get("emotions", {})
-        dominant_emotion = ""
-        if emotions:
-            dominant_emotion = max(emotions.items(), key=lambda x: x[1])[0].capitalize()
-        
-        # Creative name templates
-        name_templates = {
-            "positive-high": [
-                f"Energized & {dominant_emotion or 'Joyful'}",
-                "High Vibes Only",
-                "Uplifting Energy"
-            ],
-            "positive-low": [
-                f"Peaceful {dominant_emotion or 'Calm'}",
-                "Gentle Positivity",
-                "Serene Moments"
-            ],
-            "negative-high": [
-                f"Intense {dominant_emotion or 'Power'}",
-                "Cathartic Release",
-                "Raw Energy"
-            ],
-            "negative-low": [
-                f"Reflective {dominant_emotion or 'Melancholy'}",
-                "Quiet Contemplation",
-                "Emotional Journey"
-            ],
-            "neutral-high": [
-                "Focused Flow",
-                "Active Balance",
-                "Steady Motion"
-            ],
-            "neutral-low": [
-                "Chill Zone",
-                "Balanced Calm",
-                "Mellow Vibes"
-            ]
-        }
+        sentiment = mood_analysis.get("sentiment", "neutral")
+        energy = mood_analysis.get("energy_level", "low")
+        
+        name = self.PLAYLIST_NAMES.get(f"{sentiment}-{energy}")
+        if name is None:
+            return f"{sentiment.capitalize()} {energy.capitalize()} Mix"
         
-        mood_key = f"{mood_analysis.get('sentiment', 'neutral')}-{mood_analysis.get('energy_level', 'low')}"
-        templates = name_templates.get(mood_key, [f"{sentiment} {energy} Mix"])
+        template, default_emotion = name
+        if default_emotion is None:
+            return template
         
-        return templates[0]  # Return first template
+        dominant_emotion = self._dominant_emotion(mood_analysis)
+        return template.format(emotion=dominant_emotion.capitalize() if dominant_emotion else default_emotion)
     
     def search_tracks_by_keyword(
         self, 
@@ -268,8 +411,7 @@ class JamendoService:
         params = {
             "search": keyword,
             "limit": limit,
-            "audioformat": "mp31",
-            "include": "musicinfo"
+            "audioformat": "mp31"
         }
         
         data = self._make_request("tracks/", params)
@@ -277,17 +419,7 @@ class JamendoService:
         if not data or "results" not in data:
             return []
         
-        tracks = []
-        for track in data["results"]:
-            tracks.append({
-                "id": track.get("id"),
-                "name": track.get("name"),
-                "artist": track.get("artist_name"),
-                "audio_url": track.get("audio"),
-                "image_url": track.get("image"),
-            })
-        
-        return tracks
+        return [self._format_track(track, full=False) for track in data["results"]]
 
 
 # Global instance
@@ -1,45 +1,142 @@
-from transformers import pipeline
-import spacy
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import cached_property, lru_cache
+import numpy as np
 import openai
 import os
-from typing import Dict, Any, List
+import re
+from collections import Counter
+from typing import Dict, Any, List, Optional
 import warnings
 
 # Suppress warnings for cleaner output
 warnings.filterwarnings("ignore", category=UserWarning)
 os.environ["HF_HUB_DISABLE_SYMLINKS_WARNING"] = "1"
 
+# Sentiment and emotion models run side by side; torch releases the GIL during forward passes
+_inference_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="mood-inference")
+
+# 🎨 Color palettes by (sentiment, energy)
+_PALETTES = {
+    ("positive", "high"): ['#FF6B6B', '#FFE66D', '#FF8E53', '#FF6B9D', '#4ECDC4'],
+    ("positive", "low"):  ['#A8E6CF', '#88D8C0', '#FFEAA7', '#FD79A8', '#FDCB6E'],
+    ("negative", "high"): ['#636E72', '#2D3436', '#E17055', '#A29BFE', '#6C5CE7'],
+    ("negative", "low"):  ['#74B9FF', '#0984E3', '#A29BFE', '#DDA0DD', '#81ECEC'],
+    ("neutral", "high"):  ['#FDCB6E', '#E17055', '#00B894', '#00CEC9', '#A29BFE'],
+    ("neutral", "low"):   ['#DDDDDD', '#AAAAAA', '#888888', '#666666', '#444444']
+}
+_PALETTES_DEFAULT = _PALETTES[("neutral", "low")]
+
+# Insights based on sentiment-energy combination
+_INSIGHTS = {
+    'positive-high': "Your energy is radiating positivity! Channel this momentum into creative projects or connecting with others.",
+    'positive-low': "There's a gentle contentment in your words. This peaceful energy is perfect for reflection and self-care.",
+    'negative-high': "I sense some intensity in your emotions. Consider channeling this energy through physical activity or creative expression.",
+    'negative-low': "You seem to be processing some heavy feelings. Remember that it's okay to feel this way - try some deep breathing or gentle movement.",
+    'neutral-high': "You're in an active, balanced state. This is great energy for tackling projects or trying something new.",
+    'neutral-low': "Your mood feels steady and calm. This is a perfect time for planning, organizing, or quiet activities."
+}
+
+# Art style and music mood by sentiment
+_ART_STYLES = {
+    "positive": "circles",
+    "negative": "sharp",
+    "neutral": "organic"
+}
+
+_MUSIC_MOODS = {
+    "positive": "uplifting",
+    "negative": "soothing",
+    "neutral": "balanced"
+}
+
 class MoodAnalyzer:
+    # Keyword sets for the heuristic and fallback analysis
+    _INTENSE_WORDS = frozenset({
+        "amazing", "awesome", "fantastic", "furious", "incredible",
+        "hate", "love", "ecstatic", "angry", "thrilled", "so", "very",
+        "extremely", "super", "totally", "completely"
+    })
+    # Intense words match anywhere in the text, not just as whole words
+    _INTENSE_RE = re.compile("|".join(sorted(_INTENSE_WORDS)))
+    _POSITIVE_WORDS = frozenset({'happy', 'joy', 'love', 'excited', 'great', 'amazing',
+                                 'wonderful', 'good', 'peaceful', 'grateful'})
+    _NEGATIVE_WORDS = frozenset({'sad', 'angry', 'frustrated', 'tired', 'worried',
+                                 'stressed', 'bad', 'awful', 'terrible', 'anxious'})
+    _EMOTION_KEYWORDS = {
+        'joy': frozenset({'happy', 'excited', 'joy', 'love', 'amazing', 'wonderful'}),
+        'sadness': frozenset({'sad', 'down', 'depressed', 'lonely', 'hurt'}),
+        'anger': frozenset({'angry', 'mad', 'frustrated', 'annoyed', 'irritated'}),
+        'fear': frozenset({'scared', 'worried', 'anxious', 'nervous', 'afraid'}),
+        'surprise': frozenset({'surprised', 'shocked', 'amazed', 'unexpected'}),
+        'disgust': frozenset({'disgusted', 'sick', 'revolting', 'gross'})
+    }
+    # The emotion keyword sets are disjoint, so each word maps to at most one emotion
+    _EMOTION_BY_WORD = {word: emotion for emotion, keywords in _EMOTION_KEYWORDS.items() for word in keywords}
+    _WORD_RE = re.compile(r"[a-z']+")
+
     def __init__(self):
-        try:
-            print("🤖 Loading AI models...")
+        # Models load on first use (see the properties below) so importing this module stays cheap
+        openai.api_key = os.getenv("OPENAI_API_KEY")
 
-            # Sentiment analysis model
-            self.sentiment_analyzer = pipeline(
+    @cached_property
+    def sentiment_analyzer(self):
+        """Sentiment analysis model, or None when it can't be loaded"""
+        try:
+            from transformers import pipeline
+            print("🤖 Loading sentiment model...")
+            analyzer = pipeline(
                 "sentiment-analysis",
                 model="cardiffnlp/twitter-roberta-base-sentiment-latest",
                 top_k=None
             )
+            print("✅ Sentiment model loaded")
+            return analyzer
+        except Exception as e:
+            print(f"⚠️ Sentiment model failed to load: {e}")
+            print("🔄 Using fallback sentiment analysis")
+            return None
 
-            # Emotion analysis model
-            self.emotion_analyzer = pipeline(
+    @cached_property
+    def emotion_analyzer(self):
+        """Emotion analysis model, or None when it can't be loaded"""
+        try:
+            from transformers import pipeline
+            print("🤖 Loading emotion model...")
+            analyzer = pipeline(
                 "text-classification",
                 model="j-hartmann/emotion-english-distilroberta-base",
                 top_k=None
             )
+            print("✅ Emotion model loaded")
+            return analyzer
+        except Exception as e:
+            print(f"⚠️ Emotion model failed to load: {e}")
+            print("🔄 Using fallback emotion analysis")
+            return None
 
-            # SpaCy for NLP tasks (keywords, etc.)
-            self.nlp = spacy.load("en_core_web_sm")
-            openai.api_key = os.getenv("OPENAI_API_KEY")
-
-            print("✅ AI models loaded successfully")
-
+    @cached_property
+    def nlp(self):
+        """SpaCy for NLP tasks (keywords, etc.), or None when it can't be loaded"""
+        try:
+            import spacy
+            print("🤖 Loading spaCy model...")
+            # Keywords only need the tagger and parser (noun chunks, POS), so skip NER and lemmas
+            nlp = spacy.load("en_core_web_sm", disable=["ner", "lemmatizer"])
+            print("✅ spaCy model loaded")
+            return nlp
         except Exception as e:
-            print(f"⚠️ AI models failed to load: {e}")
-            print("🔄 Using fallback analysis methods")
-            self.sentiment_analyzer = None
-            self.emotion_analyzer = None
-            self.nlp = None
+            print(f"⚠️ spaCy model failed to load: {e}")
+            print("🔄 Using fallback keyword extraction")
+            return None
+
+    def models_loaded(self) -> Dict[str, bool]:
+        """Which models are loaded so far, without triggering a load"""
+        loaded = self.__dict__
+        return {
+            "sentiment": loaded.get("sentiment_analyzer") is not None,
+            "emotion": loaded.get("emotion_analyzer") is not None,
+            "nlp": loaded.get("nlp") is not None
+        }
 
     def heuristic_energy(self, text: str) -> str:
         """
@@ -48,22 +145,22 @@ class MoodAnalyzer:
         - High ratio of uppercase letters
         - Presence of intense words
         """
-        exclamations = text.count("!")
-        caps_ratio = sum(1 for c in text if c.isupper()) / max(len(text), 1)
-        intense_words = {
-            "amazing", "awesome", "fantastic", "furious", "incredible",
-            "hate", "love", "ecstatic", "angry", "thrilled", "so", "very", 
-            "extremely", "super", "totally", "completely"
-        }
-        intense_match = any(w in text.lower() for w in intense_words)
-        if exclamations > 1 or caps_ratio > 0.2 or intense_match:
+        # One code point per element, so the array size matches len(text); surrogatepass keeps
+        # lone surrogates (JSON bodies can carry "\ud83d") from raising
+        chars = np.frombuffer(text.encode("utf-32-le", errors="surrogatepass"), dtype=np.uint32)
+        exclamations = int(np.count_nonzero(chars == 0x21))
+        caps = int(np.count_nonzero((chars >= 0x41) & (chars <= 0x5A)))  # ASCII A-Z
+        caps_ratio = caps / max(chars.size, 1)
+        if exclamations > 1 or caps_ratio > 0.2 or self._INTENSE_RE.search(text.lower()):
             return "high"
         return "low"
 
-    def analyze_sentiment(self, text: str) -> Dict[str, Any]:
+    def analyze_sentiment(self, text: str, results: Optional[list] = None) -> Dict[str, Any]:
+        """Post-process sentiment model output, running the model only if no results are passed"""
         if self.sentiment_analyzer:
             try:
-                results = self.sentiment_analyzer(text)
+                if results is None:
+                    results = self.sentiment_analyzer(text)
                 # Flatten if results is a list of lists
                 if isinstance(results, list) and len(results) > 0 and isinstance(results[0], list):
                     results = results[0]
@@ -98,10 +195,12 @@ class MoodAnalyzer:
         # ✅ Fallback if model is unavailable
         return self._fallback_sentiment_analysis(text)
 
-    def analyze_emotions(self, text: str) -> Dict[str, float]:
+    def analyze_emotions(self, text: str, results: Optional[list] = None) -> Dict[str, float]:
+        """Post-process emotion model output, running the model only if no results are passed"""
         if self.emotion_analyzer:
             try:
-                results = self.emotion_analyzer(text)
+                if results is None:
+                    results = self.emotion_analyzer(text)
                 if isinstance(results, list) and len(results) > 0 and isinstance(results[0], list):
                     results = results[0]
                 # Ensure results is a non-empty list
@@ -120,10 +219,18 @@ class MoodAnalyzer:
         if self.nlp:
             try:
                 doc = self.nlp(text)
-                # Extract noun chunks and adjectives
-                keywords = [chunk.text.lower() for chunk in doc.noun_chunks][:5]
+                # Extract the first noun chunks, stopping once we have enough
+                for chunk in doc.noun_chunks:
+                    if len(keywords) == 5:
+                        break
+                    keywords.append(chunk.text.lower())
                 # Add important adjectives
-                adjectives = [token.text.lower() for token in doc if token.pos_ == "ADJ"][:3]
+                adjectives = []
+                for token in doc:
+                    if token.pos_ == "ADJ":
+                        adjectives.append(token.text.lower())
+                        if len(adjectives) == 3:
+                            break
                 keywords.extend(adjectives)
             except Exception as e:
                 print(f"Keyword extraction failed: {e}")
@@ -136,84 +243,68 @@ class MoodAnalyzer:
         
         return keywords
 
+    @staticmethod
+    def _future_results(future: Optional[Future], name: str) -> Optional[list]:
+        """Collect a pipeline future; an empty list makes the caller use its fallback"""
+        if future is None:
+            return None
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"{name} analysis failed: {e}")
+            return []
+
     def analyze_full_mood(self, text: str) -> Dict[str, Any]:
+        """Analyze text, reusing the cached result for text seen before (callers must not mutate it)"""
+        return _analyze_cached(text)
+
+    def clear_cache(self) -> None:
+        """Drop cached analyses, e.g. after swapping models"""
+        _analyze_cached.cache_clear()
+
+    def _analyze_uncached(self, text: str) -> Dict[str, Any]:
         print(f"🧠 Analyzing: '{text[:50]}...'")
 
-        sentiment_result = self.analyze_sentiment(text)
-        emotions = self.analyze_emotions(text)
+        # Start both transformer passes, extract keywords on this thread meanwhile
+        sentiment_future = _inference_pool.submit(self.sentiment_analyzer, text) if self.sentiment_analyzer else None
+        emotion_future = _inference_pool.submit(self.emotion_analyzer, text) if self.emotion_analyzer else None
         keywords = self.extract_keywords(text)
 
-        # 🎨 Color palettes by sentiment/energy
-        palettes = {
-            "positive": {
-                "high": ['#FF6B6B', '#FFE66D', '#FF8E53', '#FF6B9D', '#4ECDC4'],
-                "low":  ['#A8E6CF', '#88D8C0', '#FFEAA7', '#FD79A8', '#FDCB6E']
-            },
-            "negative": {
-                "high": ['#636E72', '#2D3436', '#E17055', '#A29BFE', '#6C5CE7'],
-                "low":  ['#74B9FF', '#0984E3', '#A29BFE', '#DDA0DD', '#81ECEC']
-            },
-            "neutral": {
-                "high": ['#FDCB6E', '#E17055', '#00B894', '#00CEC9', '#A29BFE'],
-                "low":  ['#DDDDDD', '#AAAAAA', '#888888', '#666666', '#444444']
-            }
-        }
+        sentiment_result = self.analyze_sentiment(text, self._future_results(sentiment_future, "Sentiment"))
+        emotions = self.analyze_emotions(text, self._future_results(emotion_future, "Emotion"))
 
-        # ✅ Use computed energy for palette selection
         energy = sentiment_result.get("energy", "low")  # Fixed: get energy properly
-        color_palette = palettes.get(sentiment_result["sentiment"], palettes["neutral"]).get(energy, palettes["neutral"]["low"])
-
-        # Generate insights based on sentiment-energy combination
-        insights = {
-            'positive-high': "Your energy is radiating positivity! Channel this momentum into creative projects or connecting with others.",
-            'positive-low': "There's a gentle contentment in your words. This peaceful energy is perfect for reflection and self-care.",
-            'negative-high': "I sense some intensity in your emotions. Consider channeling this energy through physical activity or creative expression.",
-            'negative-low': "You seem to be processing some heavy feelings. Remember that it's okay to feel this way - try some deep breathing or gentle movement.",
-            'neutral-high': "You're in an active, balanced state. This is great energy for tackling projects or trying something new.",
-            'neutral-low': "Your mood feels steady and calm. This is a perfect time for planning, organizing, or quiet activities."
-        }
-
-        # Determine art style and music mood
-        art_styles = {
-            "positive": "circles",
-            "negative": "sharp", 
-            "neutral": "organic"
-        }
-        
-        music_moods = {
-            "positive": "uplifting",
-            "negative": "soothing",
-            "neutral": "balanced"
-        }
+        color_palette = _PALETTES.get((sentiment_result["sentiment"], energy), _PALETTES_DEFAULT)
 
         result = {
             "sentiment": sentiment_result["sentiment"],
             "sentiment_confidence": sentiment_result["confidence"],
             "energy_level": energy,  # ✅ Fixed: use the extracted energy variable
             "emotions": emotions,
+            "dominant_emotion": max(emotions, key=emotions.get) if emotions else None,
             "keywords": keywords,
             "color_palette": color_palette,
-            "art_style": art_styles.get(sentiment_result["sentiment"], "organic"),
-            "music_mood": music_moods.get(sentiment_result["sentiment"], "balanced"),
-            "ai_insight": insights.get(sentiment_result.get("combined_label"), "Every emotion is valid and temporary. You're doing great by checking in with yourself.")
+            "art_style": _ART_STYLES.get(sentiment_result["sentiment"], "organic"),
+            "music_mood": _MUSIC_MOODS.get(sentiment_result["sentiment"], "balanced"),
+            "ai_insight": _INSIGHTS.get(sentiment_result.get("combined_label"), "Every emotion is valid and temporary. You're doing great by checking in with yourself.")
         }
 
         print(f"✅ Analysis complete: {sentiment_result['sentiment']} sentiment at {sentiment_result['confidence']*100:.1f}% confidence, energy: {energy}")
         return result
 
     def _fallback_sentiment_analysis(self, text: str) -> Dict[str, Any]:
-        positive_words = ['happy', 'joy', 'love', 'excited', 'great', 'amazing',
-                          'wonderful', 'good', 'peaceful', 'grateful']
-        negative_words = ['sad', 'angry', 'frustrated', 'tired', 'worried',
-                          'stressed', 'bad', 'awful', 'terrible', 'anxious']
-
-        words = text.lower().split()
-        positive_count = sum(1 for word in words if word in positive_words)
-        negative_count = sum(1 for word in words if word in negative_words)
+        word_count = positive_count = negative_count = 0
+        for match in self._WORD_RE.finditer(text.lower()):
+            word = match.group()
+            word_count += 1
+            if word in self._POSITIVE_WORDS:
+                positive_count += 1
+            elif word in self._NEGATIVE_WORDS:
+                negative_count += 1
 
         # ✅ Fixed confidence calculation
         confidence = max(0.6, min(0.95,
-            (abs(positive_count - negative_count) + 1) / (len(words) / 10 + 1)
+            (abs(positive_count - negative_count) + 1) / (word_count / 10 + 1)
         ))
 
         if positive_count > negative_count:
@@ -236,20 +327,17 @@ class MoodAnalyzer:
 
     def _fallback_emotion_analysis(self, text: str) -> Dict[str, float]:
         """Simple keyword-based emotion analysis fallback"""
-        emotion_keywords = {
-            'joy': ['happy', 'excited', 'joy', 'love', 'amazing', 'wonderful'],
-            'sadness': ['sad', 'down', 'depressed', 'lonely', 'hurt'],
-            'anger': ['angry', 'mad', 'frustrated', 'annoyed', 'irritated'],
-            'fear': ['scared', 'worried', 'anxious', 'nervous', 'afraid'],
-            'surprise': ['surprised', 'shocked', 'amazed', 'unexpected'],
-            'disgust': ['disgusted', 'sick', 'revolting', 'gross']
-        }
+        counts = Counter()
+        word_count = 0
+        for match in self._WORD_RE.finditer(text.lower()):
+            word_count += 1
+            emotion = self._EMOTION_BY_WORD.get(match.group())
+            if emotion:
+                counts[emotion] += 1
         
-        words = text.lower().split()
         emotions = {}
-        
-        for emotion, keywords in emotion_keywords.items():
-            score = sum(1 for word in words if word in keywords) / max(len(words), 1)
+        for emotion in self._EMOTION_KEYWORDS:
+            score = counts[emotion] / max(word_count, 1)
             emotions[emotion] = min(score * 3, 1.0)  # Scale and cap at 1.0
         
         # Ensure at least some emotion
@@ -260,4 +348,9 @@ class MoodAnalyzer:
 
 
 # === Global Analyzer Instance ===
-mood_analyzer = MoodAnalyzer()
\ No newline at end of file
+mood_analyzer = MoodAnalyzer()
+
+# Results only depend on the text for fixed model weights, so repeat texts skip inference
+@lru_cache(maxsize=1024)
+def _analyze_cached(text: str) -> Dict[str, Any]:
+    return mood_analyzer._analyze_uncached(text)
\ No newline at end of file
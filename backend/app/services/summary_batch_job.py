@@ -0,0 +1,125 @@
+# backend/app/services/summary_batch_job.py
+# Nightly precompute of weekly summaries
+# Responsibilities:
+# - Summarize every active user's last 7 days off-peak (concurrent calls share Llama batches)
+# - Upsert one Llama summary per user so /weekly-summary can skip the live call
+# - Claim each night's run in the database so only one worker makes the calls
+
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from itertools import groupby
+from operator import attrgetter
+from typing import List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models import JobRun, MoodEntry, User, WeeklySummary
+from app.services.summary_service import generate_llama_summary
+
+# Summaries in flight at once; enough to fill the summary batcher several times over
+JOB_CONCURRENCY = 32
+
+# JobRun name claimed once per day by whichever worker runs the job
+JOB_NAME = "weekly_summaries"
+
+# INSERT ... ON CONFLICT builders for the databases the app runs on
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+def get_precomputed_summary(db: Session, user_id: int, entries: List) -> Optional[WeeklySummary]:
+    """Stored summary for the user, if it was written for exactly these entries"""
+    stored = db.get(WeeklySummary, user_id)
+    if stored and stored.entries_count == len(entries) and stored.last_entry_id == max(entry.id for entry in entries):
+        return stored
+    return None
+
+async def precompute_weekly_summaries() -> int:
+    """Summarize and store the last 7 days for every active user with entries; returns summaries stored"""
+    db = SessionLocal()
+    try:
+        seven_days_ago = datetime.utcnow() - timedelta(days=7)
+        rows = db.execute(
+            select(MoodEntry.id, MoodEntry.user_id, MoodEntry.sentiment, MoodEntry.energy_level, MoodEntry.created_at)
+            .join(User, User.id == MoodEntry.user_id)
+            .where(User.is_active.is_(True), MoodEntry.created_at >= seven_days_ago)
+            .order_by(MoodEntry.user_id, MoodEntry.created_at.desc())
+        ).all()
+        weeks = {user_id: list(group) for user_id, group in groupby(rows, key=attrgetter("user_id"))}
+        
+        semaphore = asyncio.Semaphore(JOB_CONCURRENCY)
+        
+        async def summarize(entries: List) -> Optional[str]:
+            async with semaphore:
+                return await generate_llama_summary(entries)
+        
+        summaries = await asyncio.gather(*(summarize(entries) for entries in weeks.values()))
+        
+        # Only real Llama output is stored; fallback weeks are cheap to build live, and a
+        # stored fallback would hide a working Llama all day after a bad night
+        records = [
+            {
+                "user_id": user_id,
+                "summary": summary,
+                "entries_count": len(entries),
+                "last_entry_id": max(entry.id for entry in entries)
+            }
+            for (user_id, entries), summary in zip(weeks.items(), summaries)
+            if summary
+        ]
+        
+        # One upsert for all users: a run overlapping another (e.g. a manual one) overwrites its
+        # rows instead of failing on the user_id primary key
+        if records:
+            upsert = _UPSERT_INSERTS[db.get_bind().dialect.name](WeeklySummary)
+            upsert = upsert.on_conflict_do_update(
+                index_elements=[WeeklySummary.user_id],
+                set_={
+                    "summary": upsert.excluded.summary,
+                    "entries_count": upsert.excluded.entries_count,
+                    "last_entry_id": upsert.excluded.last_entry_id,
+                    "generated_at": func.now()
+                }
+            )
+            db.execute(upsert, records)
+        
+        db.commit()
+        return len(records)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def claim_run(name: str, run_date: date) -> bool:
+    """Record that this process runs the job today; False if another worker already did"""
+    db = SessionLocal()
+    try:
+        claim = _UPSERT_INSERTS[db.get_bind().dialect.name](JobRun)\
+            .values(name=name, run_date=run_date)\
+            .on_conflict_do_nothing(index_elements=[JobRun.name, JobRun.run_date])
+        claimed = db.execute(claim).rowcount == 1
+        db.commit()
+        return claimed
+    finally:
+        db.close()
+
+def _seconds_until_next_run(now: datetime) -> float:
+    next_run = now.replace(hour=settings.SUMMARY_JOB_HOUR_UTC, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+async def run_nightly():
+    """Background task: precompute summaries once a day at SUMMARY_JOB_HOUR_UTC"""
+    while True:
+        await asyncio.sleep(_seconds_until_next_run(datetime.now(timezone.utc)))
+        try:
+            # Every uvicorn worker wakes up here; the first to claim the day does the work
+            if not claim_run(JOB_NAME, datetime.now(timezone.utc).date()):
+                continue
+            count = await precompute_weekly_summaries()
+            print(f"✅ Precomputed weekly summaries for {count} users")
+        except Exception as e:
+            print(f"❌ Weekly summary precompute failed: {e}")
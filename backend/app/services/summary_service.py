@@ -1,190 +1,413 @@
 # backend/app/services/summary_service.py
+import asyncio
+import hashlib
+import json
+import logging
 import os
-import requests
-from typing import List
+import random
+import re
+import httpx
+from collections import Counter
+from operator import attrgetter
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # FREE Hugging Face Inference Router for Llama-3
 HF_API_KEY = os.getenv("HUGGINGFACE_API_KEY", "")
 LLAMA_API_URL = "https://router.huggingface.co/v1/chat/completions"
 
-async def generate_weekly_summary(mood_entries: List) -> str:
+# Shared async client so a slow Llama call doesn't block the event loop.
+# Tight timeouts plus retries beat waiting out one stuck 30s request.
+# HTTP/2 keeps one TLS connection open and multiplexes batched/concurrent posts over it.
+_client = httpx.AsyncClient(
+    http2=True,
+    timeout=httpx.Timeout(10.0, connect=3.0),
+    headers={"Authorization": f"Bearer {HF_API_KEY}"},
+    limits=httpx.Limits(max_keepalive_connections=20, max_connections=50)
+)
+LLAMA_MAX_ATTEMPTS = 3
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+SENTENCE_END_RE = re.compile(r"[.!?]\s*$")
+
+# Summaries keyed by a hash of the week block; decoding is greedy, so a week always maps to the same
+# answer. Only successful Llama answers are stored.
+_summary_cache = TTLCache(maxsize=10_000, ttl=3600)
+
+# Entry attributes read in one C-level call per entry
+_entry_fields = attrgetter("created_at", "sentiment", "energy_level")
+_mood_fields = attrgetter("sentiment", "energy_level")
+
+# Short English day names by date.weekday(), avoiding strftime's locale-dependent lookup
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+SENTIMENT_SIGNS = {"positive": "+", "negative": "-", "neutral": "~"}
+
+# Third-person phrasing Llama sometimes uses, rewritten to address the user
+SECOND_PERSON = {"This person": "You", "this person": "you", "Their": "Your", "their": "your"}
+THIRD_PERSON_RE = re.compile(r"\b(?:This person|this person|Their|their)\b")
+
+# Creative fallback summaries by (mood pattern, high energy)
+FALLBACK_SUMMARIES = {
+    ("positive", True): (
+        "Your week sparkled with positive energy and enthusiastic momentum.",
+        "A vibrant week full of joy, excitement, and uplifting moments.",
+        "You radiated positivity this week, riding waves of high energy and happiness."
+    ),
+    ("positive", False): (
+        "A peacefully positive week filled with contentment and gentle joy.",
+        "Your week glowed with quiet happiness and serene contentment.",
+        "Calm positivity defined your week, with peaceful moments of gratitude."
+    ),
+    ("negative", True): (
+        "This week brought intense challenges that you faced head-on with strength.",
+        "A powerful week of processing difficult emotions with courage and resilience.",
+        "You navigated turbulent waters this week, showing remarkable emotional strength."
+    ),
+    ("negative", False): (
+        "A reflective week of processing emotions, showing your emotional awareness.",
+        "You moved through this challenging week with grace and self-compassion.",
+        "A gentle week of healing, allowing yourself space to feel and process."
+    ),
+    ("leaning_positive", None): (
+        "Your week leaned toward the bright side, with more smiles than struggles.",
+        "A balanced week that tilted positive, with hope outweighing the challenges.",
+        "You found more light than shadow this week, celebrating small victories."
+    ),
+    ("leaning_negative", None): (
+        "This week asked a lot of you, and you showed up for yourself.",
+        "A challenging week where you practiced resilience and self-care.",
+        "You weathered some storms this week with admirable emotional awareness."
+    ),
+    ("balanced", None): (
+        "A balanced week of varied emotions, each moment teaching you something valuable.",
+        "Your week was a tapestry of different feelings, all equally valid and meaningful.",
+        "You experienced the full spectrum of emotions this week, embracing each one.",
+        "A wonderfully human week of ups and downs, growth and reflection."
+    )
+}
+
+# Terse prompts keep prefill short; the key explains the compact week notation
+PROMPT_KEY = "Week as day:mood/energy (+ positive, - negative, ~ neutral; hi/lo energy), then mood totals."
+
+
+def build_week_block(mood_entries: List) -> str:
+    """Describe one user's week tersely for the Llama prompt (e.g. Mon:+/hi, Sun:-/lo. +1/-1/~0, hi-energy 1)"""
+    # Prepare mood data: (day, sentiment, energy) per entry
+    rows = [
+        (WEEKDAYS[created_at.weekday()], sentiment or "neutral", energy or "calm")
+        for created_at, sentiment, energy in map(_entry_fields, mood_entries)
+    ]
+    
+    # Count patterns
+    sentiment_counts = Counter(sentiment for _, sentiment, _ in rows)
+    high_energy = sum(1 for _, _, energy in rows if energy == "high")
+    
+    days = ", ".join(
+        f"{day}:{SENTIMENT_SIGNS.get(sentiment, '~')}/{'hi' if energy == 'high' else 'lo'}"
+        for day, sentiment, energy in rows
+    )
+    return (
+        f"{days}. +{sentiment_counts['positive']}/-{sentiment_counts['negative']}"
+        f"/~{sentiment_counts['neutral']}, hi-energy {high_energy}"
+    )
+
+
+def clean_summary(summary: str) -> Optional[str]:
+    """Tidy a generated sentence; None if it isn't usable"""
+    # Clean up the summary: address the reader directly, drop wrapping quotes
+    summary = THIRD_PERSON_RE.sub(lambda m: SECOND_PERSON[m.group(0)], summary).strip(' \t\n"\'')
+    
+    # Ensure proper ending
+    if summary and not summary.endswith(('.', '!', '?')):
+        summary += '.'
+    
+    # Validate length
+    if summary and 15 < len(summary) < 400:
+        return summary
+    
+    logger.warning("⚠️ Summary length invalid: %d chars", len(summary))
+    return None
+
+
+class SummaryBatcher:
     """
-    Generate a one-sentence weekly mood summary using FREE Meta-Llama-3-8B
+    Collects summary requests that arrive close together and sends them
+    to Llama as one chat completion (one JSON array answer per batch)
     """
-    if not mood_entries:
-        return "No mood data available for summary."
     
-    # Prepare mood data
-    mood_summary = []
-    sentiments = []
-    energies = []
+    def __init__(self, max_batch_size: int = 8, max_wait: float = 0.05):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._in_flight: Set[asyncio.Task] = set()
     
-    for entry in mood_entries:
-        day = entry.created_at.strftime("%A")
-        sentiment = entry.sentiment or "neutral"
-        energy = entry.energy_level or "calm"
+    async def submit(self, week_block: str, days: int) -> Optional[str]:
+        """Queue one user's week and wait for its summary (None means use the fallback)"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._collect())
         
-        sentiments.append(sentiment)
-        energies.append(energy)
-        mood_summary.append(f"{day}: {sentiment} mood, {energy} energy")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((self._bucket(days), week_block, future))
+        return await future
     
-    # Count patterns
-    positive_count = sentiments.count("positive")
-    negative_count = sentiments.count("negative")
-    neutral_count = sentiments.count("neutral")
-    high_energy = energies.count("high")
+    @staticmethod
+    def _bucket(days: int) -> int:
+        """Length bucket (1-2, 3-5, 6-7 days) so batched prompts hold similar-sized blocks"""
+        days = min(days, 7)
+        if days <= 2:
+            return 0
+        if days <= 5:
+            return 1
+        return 2
     
-    mood_text = "\n".join(mood_summary[:7])  # Last 7 days
+    async def _collect(self):
+        """Group queued requests into batches and dispatch them without waiting for replies"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            # Each length bucket goes out as its own chat completion
+            buckets = {}
+            for bucket, block, future in batch:
+                buckets.setdefault(bucket, []).append((block, future))
+            
+            for jobs in buckets.values():
+                task = asyncio.create_task(self._dispatch(jobs))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
     
-    try:
-        if not HF_API_KEY:
-            print("⚠️ No Hugging Face API key, using fallback")
-            return generate_fallback_summary(mood_entries)
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]]):
+        blocks = [block for block, _ in batch]
+        try:
+            summaries = await self._request_summaries(blocks)
+        except Exception as e:
+            logger.error("❌ Llama summary generation failed: %s", e)
+            summaries = [None] * len(batch)
         
-        headers = {
-            "Authorization": f"Bearer {HF_API_KEY}",
-            "Content-Type": "application/json"
-        }
+        for (_, future), summary in zip(batch, summaries):
+            if not future.done():
+                future.set_result(summary)
+    
+    async def _request_summaries(self, blocks: List[str]) -> List[Optional[str]]:
+        """One chat completion for the whole batch; a single request keeps the plain one-sentence prompt"""
+        if len(blocks) == 1:
+            prompt = f"""As a warm wellness coach, write ONE encouraging sentence (max 50 words) summarizing this person's week.
+{PROMPT_KEY}
+{blocks[0]}"""
+        else:
+            users = "\n".join(f"User {i}: {block}" for i, block in enumerate(blocks, 1))
+            prompt = f"""As a warm wellness coach, write ONE encouraging sentence (max 50 words) per user summarizing their week.
+{PROMPT_KEY}
+Address each user as "you". Return ONLY JSON: {{"summaries": [{len(blocks)} sentences, in user order]}}
+{users}"""
         
         # Llama-3 chat format
         payload = {
             "model": "meta-llama/Meta-Llama-3-8B-Instruct",
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "You are a compassionate emotional wellness assistant. Write warm, encouraging, concise summaries."
-                },
-                {
-                    "role": "user",
-                    "content": f"""Summarize this person's emotional week in EXACTLY ONE sentence (max 50 words). Be warm and encouraging.
-Week overview: {mood_text} 
-Stats: {positive_count} positive days, {negative_count} negative days, {neutral_count} neutral days, {high_energy} high energy days.
-Write ONE encouraging sentence summarizing their week:"""
-                }
-            ],
-            "max_tokens": 60,
-            "temperature": 0.8,
-            "top_p": 0.9
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": 60 * len(blocks),
+            "temperature": 0  # greedy: same week, same summary, so cached answers stay valid
         }
+        if len(blocks) == 1:
+            # Plain text so the stream can stop at the sentence end (JSON would need the whole object)
+            payload["stop"] = ["\n\n", "."]
+            result = await _call_with_retry(lambda: _stream_sentence(payload))
+            if result is None or not _status_ok(*result):
+                return [None]
+            return [clean_summary(result[1])]
         
-        response = requests.post(LLAMA_API_URL, headers=headers, json=payload, timeout=30)
+        # Batches are constrained to a JSON object, so the answer list always parses
+        payload["response_format"] = {"type": "json_object"}
+        result = await _call_with_retry(lambda: _post(payload))
+        if result is None or not _status_ok(*result):
+            return [None] * len(blocks)
         
-        print(f"🔍 Llama API Status: {response.status_code}")
+        # Only a 200 body is parsed; the dict is formatted lazily, and only at DEBUG
+        result = result[1].json()
+        logger.debug("🔍 Llama Response: %s", result)
         
-        if response.status_code == 200:
-            result = response.json()
-            print(f"🔍 Llama Response: {result}")
-            
-            # Extract the message from Llama's response
-            if "choices" in result and len(result["choices"]) > 0:
-                message = result["choices"][0].get("message", {})
-                summary = message.get("content", "").strip()
-                
-                # Clean up the summary
-                summary = summary.replace("This person", "You")
-                summary = summary.replace("this person", "you")
-                summary = summary.replace("their", "your")
-                summary = summary.replace("Their", "Your")
-                summary = summary.strip('"').strip("'").strip()
-                
-                # Ensure proper ending
-                if summary and not summary.endswith(('.', '!', '?')):
-                    summary += '.'
-                
-                # Validate length
-                if summary and 15 < len(summary) < 400:
-                    print(f"✅ Llama-3 summary generated: {summary}")
-                    return summary
-                else:
-                    print(f"⚠️ Summary length invalid: {len(summary)} chars")
-            
-            print("⚠️ Invalid response format, using fallback")
-            return generate_fallback_summary(mood_entries)
+        # Extract the message from Llama's response
+        if not result.get("choices"):
+            logger.warning("⚠️ Invalid response format, using fallback")
+            return [None] * len(blocks)
         
-        elif response.status_code == 503:
-            print("⏳ Llama model is loading, using fallback")
-            return generate_fallback_summary(mood_entries)
+        content = result["choices"][0].get("message", {}).get("content", "")
         
-        else:
-            print(f"⚠️ Llama API error {response.status_code}: {response.text}")
-            return generate_fallback_summary(mood_entries)
+        try:
+            answers = json.loads(content).get("summaries")
+        except (ValueError, AttributeError):
+            answers = None
+        if not isinstance(answers, list) or len(answers) != len(blocks):
+            logger.warning("⚠️ Invalid batched response format, using fallback")
+            return [None] * len(blocks)
+        
+        return [clean_summary(answer) if isinstance(answer, str) else None for answer in answers]
+
+
+async def aclose() -> None:
+    """Close the pooled Llama connection"""
+    await _client.aclose()
+
+
+async def _post(payload: dict) -> Tuple[int, httpx.Response]:
+    response = await _client.post(LLAMA_API_URL, json=payload)
+    return response.status_code, response
+
+
+async def _stream_sentence(payload: dict) -> Tuple[int, Any]:
+    """Stream a completion and hang up as soon as the first sentence is complete"""
+    async with _client.stream("POST", LLAMA_API_URL, json={**payload, "stream": True}) as response:
+        if response.status_code != 200:
+            # Error bodies are only read when _status_ok will actually log them
+            if logger.isEnabledFor(logging.WARNING):
+                await response.aread()
+            return response.status_code, response
+        
+        text = ""
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            choices = json.loads(data).get("choices") or [{}]
+            text += choices[0].get("delta", {}).get("content") or ""
+            if SENTENCE_END_RE.search(text):
+                break
+        
+        logger.debug("🔍 Llama streamed: %s", text)
+        return response.status_code, text
+
+
+def _status_ok(status_code: int, response: Any) -> bool:
+    """Log why a finished Llama call can't be used"""
+    logger.debug("🔍 Llama API Status: %s", status_code)
+    
+    if status_code == 503:
+        logger.warning("⏳ Llama model is loading, using fallback")
+        return False
+    
+    if status_code != 200:
+        if logger.isEnabledFor(logging.WARNING):
+            logger.warning("⚠️ Llama API error %s: %s", status_code, response.text)
+        return False
+    
+    return True
+
+
+async def _call_with_retry(send: Callable[[], Awaitable[Tuple[int, Any]]]) -> Optional[Tuple[int, Any]]:
+    """Run a Llama call, retrying timeouts, dropped connections and busy/loading responses with backoff"""
+    for attempt in range(LLAMA_MAX_ATTEMPTS):
+        last_attempt = attempt == LLAMA_MAX_ATTEMPTS - 1
+        try:
+            status_code, body = await send()
+            if status_code not in RETRY_STATUS_CODES or last_attempt:
+                return status_code, body
+            reason = f"status {status_code}"
+        except httpx.TransportError as e:
+            if last_attempt:
+                logger.warning("⏳ Llama API unreachable after %d attempts (%s), using fallback", LLAMA_MAX_ATTEMPTS, type(e).__name__)
+                return None
+            reason = type(e).__name__
+        
+        delay = min(4.0, 0.5 * (2 ** attempt) * (1 + random.random() * 0.5))
+        logger.warning("⚠️ Llama API %s (attempt %d/%d), retrying in %.1fs", reason, attempt + 1, LLAMA_MAX_ATTEMPTS, delay)
+        await asyncio.sleep(delay)
+    
+    return None
+
+
+summary_batcher = SummaryBatcher()
+
+
+async def generate_weekly_summary(mood_entries: List) -> str:
+    """
+    Generate a one-sentence weekly mood summary using FREE Meta-Llama-3-8B.
+    Entries come newest first; the summary considers the latest 7 entries only.
+    Falls back to the templated summary whenever Llama isn't used or fails.
+    """
+    if not mood_entries:
+        return "No mood data available for summary."
     
-    except Exception as e:
-        print(f"❌ Llama summary generation failed: {e}")
-        return generate_fallback_summary(mood_entries)
+    mood_entries = mood_entries[:7]
+    return await generate_llama_summary(mood_entries) or generate_fallback_summary(mood_entries)
+
+
+async def generate_llama_summary(mood_entries: List) -> Optional[str]:
+    """
+    Llama-3 summary of the latest 7 entries, or None when the week should get the fallback.
+    Weeks with fewer than 3 entries or a single sentiment skip Llama, since it adds little there.
+    """
+    mood_entries = mood_entries[:7]
+    
+    if len(mood_entries) < 3 or len({entry.sentiment or "neutral" for entry in mood_entries}) == 1:
+        return None
+    
+    if not HF_API_KEY:
+        logger.warning("⚠️ No Hugging Face API key, using fallback")
+        return None
+    
+    week_block = build_week_block(mood_entries)
+    
+    # Identical weeks (same days, moods and stats) reuse the first summary generated for them
+    cache_key = hashlib.blake2b(week_block.encode("utf-8"), digest_size=16).digest()
+    cached = _summary_cache.get(cache_key)
+    if cached:
+        return cached
+    
+    summary = await summary_batcher.submit(week_block, len(mood_entries))
+    if summary:
+        logger.info("✅ Llama-3 summary generated: %s", summary)
+        _summary_cache[cache_key] = summary
+    return summary
 
 
 def generate_fallback_summary(mood_entries: List) -> str:
     """Enhanced fallback summary - sounds natural and personalized!"""
-    import random
-    
-    sentiments = [e.sentiment for e in mood_entries if e.sentiment]
-    energies = [e.energy_level for e in mood_entries if e.energy_level]
+    moods = list(map(_mood_fields, mood_entries))
+    sentiments = [sentiment for sentiment, _ in moods if sentiment]
+    energies = [energy for _, energy in moods if energy]
     
     if not sentiments:
         return "Your week was full of experiences worth reflecting on."
     
-    positive_count = sentiments.count("positive")
-    negative_count = sentiments.count("negative")
-    high_energy_count = energies.count("high")
+    sentiment_counts = Counter(sentiments)
+    positive_count = sentiment_counts["positive"]
+    negative_count = sentiment_counts["negative"]
+    high_energy_count = Counter(energies)["high"]
     
     total = len(sentiments)
     positive_ratio = positive_count / total
     negative_ratio = negative_count / total
     energy_ratio = high_energy_count / len(energies) if energies else 0.5
     
-    # Creative summaries based on mood patterns
+    # Pick the mood pattern; energy only matters for strongly one-sided weeks
     if positive_ratio > 0.75:
-        if energy_ratio > 0.6:
-            summaries = [
-                "Your week sparkled with positive energy and enthusiastic momentum.",
-                "A vibrant week full of joy, excitement, and uplifting moments.",
-                "You radiated positivity this week, riding waves of high energy and happiness."
-            ]
-        else:
-            summaries = [
-                "A peacefully positive week filled with contentment and gentle joy.",
-                "Your week glowed with quiet happiness and serene contentment.",
-                "Calm positivity defined your week, with peaceful moments of gratitude."
-            ]
-    
+        pattern = ("positive", energy_ratio > 0.6)
     elif negative_ratio > 0.75:
-        if energy_ratio > 0.6:
-            summaries = [
-                "This week brought intense challenges that you faced head-on with strength.",
-                "A powerful week of processing difficult emotions with courage and resilience.",
-                "You navigated turbulent waters this week, showing remarkable emotional strength."
-            ]
-        else:
-            summaries = [
-                "A reflective week of processing emotions, showing your emotional awareness.",
-                "You moved through this challenging week with grace and self-compassion.",
-                "A gentle week of healing, allowing yourself space to feel and process."
-            ]
-    
+        pattern = ("negative", energy_ratio > 0.6)
     elif positive_ratio > negative_ratio + 0.2:
-        summaries = [
-            "Your week leaned toward the bright side, with more smiles than struggles.",
-            "A balanced week that tilted positive, with hope outweighing the challenges.",
-            "You found more light than shadow this week, celebrating small victories."
-        ]
-    
+        pattern = ("leaning_positive", None)
     elif negative_ratio > positive_ratio + 0.2:
-        summaries = [
-            "This week asked a lot of you, and you showed up for yourself.",
-            "A challenging week where you practiced resilience and self-care.",
-            "You weathered some storms this week with admirable emotional awareness."
-        ]
-    
+        pattern = ("leaning_negative", None)
     else:
-        summaries = [
-            "A balanced week of varied emotions, each moment teaching you something valuable.",
-            "Your week was a tapestry of different feelings, all equally valid and meaningful.",
-            "You experienced the full spectrum of emotions this week, embracing each one.",
-            "A wonderfully human week of ups and downs, growth and reflection."
-        ]
-    
-    return random.choice(summaries)
\ No newline at end of file
+        pattern = ("balanced", None)
+    
+    summaries = FALLBACK_SUMMARIES[pattern]
+    return summaries[random.randrange(len(summaries))]
@@ -0,0 +1,84 @@
+# backend/tests/test_mood_history.py
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import orjson
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+# Stored the way the server default writes them: SQLite text, no fractional seconds.
+# Entries 2-4 share a timestamp, so only the id tiebreak orders them.
+ENTRIES = [
+    (1, "2026-01-05 09:00:00"),
+    (2, "2026-01-06 09:00:00"),
+    (3, "2026-01-06 09:00:00"),
+    (4, "2026-01-06 09:00:00"),
+    (5, "2026-01-07 09:00:00"),
+]
+
+def make_db() -> Session:
+    from app.core.database import Base
+    import app.models  # noqa: F401 - registers the tables
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = Session(engine)
+    db.execute(text("INSERT INTO users (id, username, email, hashed_password) VALUES (1, 'bob', 'bob@example.com', 'x')"))
+    for entry_id, created_at in ENTRIES:
+        db.execute(
+            text("INSERT INTO mood_entries (id, user_id, text_content, created_at) VALUES (:id, 1, 'entry', :created_at)"),
+            {"id": entry_id, "created_at": created_at}
+        )
+    db.commit()
+    return db
+
+def fetch_page(db: Session, after=None, limit=2):
+    from app.api.auth import UserCtx
+    from app.api.moods import get_mood_history
+
+    response = asyncio.run(get_mood_history(limit=limit, after=after, current_user=UserCtx(id=1, username="bob"), db=db))
+    page = orjson.loads(response.body)
+    return [entry["id"] for entry in page["entries"]], page["next_cursor"]
+
+def fetch_all(db: Session, after=None):
+    ids = []
+    while True:
+        page_ids, after = fetch_page(db, after)
+        ids += page_ids
+        if not after:
+            return ids
+
+def test_pages_follow_created_at_then_id():
+    db = make_db()
+    assert fetch_all(db) == [5, 4, 3, 2, 1]
+
+def test_cursor_survives_deleted_entry():
+    db = make_db()
+    first_page, cursor = fetch_page(db)
+    assert first_page == [5, 4]
+
+    db.execute(text("DELETE FROM mood_entries WHERE id = 4"))
+    db.commit()
+    assert fetch_all(db, cursor) == [3, 2, 1]
+
+def test_cursor_seeks_on_created_at_index():
+    from app.api.moods import _history_query
+    from datetime import datetime
+
+    db = make_db()
+    compiled = _history_query(db, 1, (datetime(2026, 1, 6, 9, 0, 0), 3), 3).compile(dialect=db.get_bind().dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    plan = " ".join(row[-1] for row in db.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params))
+
+    print(f"  plan: {plan}")
+    assert "ix_moods_user_created (user_id=? AND created_at<?)" in plan
+
+if __name__ == "__main__":
+    print("🧪 Testing mood history keyset pagination\n")
+    test_pages_follow_created_at_then_id()
+    test_cursor_survives_deleted_entry()
+    test_cursor_seeks_on_created_at_index()
+    print("\n✅ SUCCESS! History pages are ordered and seek on the index.")
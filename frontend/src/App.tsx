@@ -145,7 +145,7 @@ const MoodBoardAI: React.FC = () => {
   const loadMoodHistory = async () => {
     try {
       const history = await moodService.getMoodHistory(10);
-      setMoodHistory(history);
+      setMoodHistory(history.entries);
     } catch (error) {
       console.error('Failed to load mood history:', error);
     }
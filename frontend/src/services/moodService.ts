@@ -46,6 +46,11 @@ export interface MoodHistoryEntry {
   created_at: string;
 }
 
+export interface MoodHistoryPage {
+  entries: MoodHistoryEntry[];
+  next_cursor: string | null;
+}
+
 class MoodService {
   private async handleResponse<T>(response: Response): Promise<T> {
     if (!response.ok) {
@@ -87,18 +92,24 @@ class MoodService {
   }
 
   // AUTHENTICATED: Get mood history
-  async getMoodHistory(limit: number = 20, skip: number = 0): Promise<MoodHistoryEntry[]> {
+  // Pass the previous page's next_cursor as `after` to load older entries
+  async getMoodHistory(limit: number = 20, after?: string): Promise<MoodHistoryPage> {
     const token = localStorage.getItem('auth_token');
     if (!token) {
       throw new Error('Authentication required');
     }
 
-    const response = await fetch(`${API_BASE_URL}/api/moods/history?limit=${limit}&skip=${skip}`, {
+    const params = new URLSearchParams({ limit: String(limit) });
+    if (after) {
+      params.set('after', after);
+    }
+
+    const response = await fetch(`${API_BASE_URL}/api/moods/history?${params}`, {
       headers: { 
         'Authorization': `Bearer ${token}`
       },
     });
-    return this.handleResponse<MoodHistoryEntry[]>(response);
+    return this.handleResponse<MoodHistoryPage>(response);
   }
 
   // AUTHENTICATED: Get mood statistics